@@ -7,3 +7,6 @@ FINAL_ETA = .0
 
 # final neighbourhood radius
 FINAL_NHR = 1
+
+# maximum number of input vectors per BMU search chunk
+BMU_CHUNK_SIZE = 4096
@@ -22,7 +22,7 @@ class SomBase:
     """
     def __init__(self, dims: SomDims, n_iter: int, eta: float,
                  nhr: float, nh_shape: str, init_weights: WeightInit,
-                 metric: Metric, seed: float | None = None):
+                 metric: Metric, seed: int | None = None):
 
         self._grid = grid.SomGrid(dims[:2])
         self.n_features = dims[2]
@@ -52,7 +52,7 @@ class SomBase:
             raise ValueError("Neighbourhood radius must be int > 0.")
 
         if seed is not None:
-            np.random.seed(seed)
+            utils.reseed(seed)
 
         if isinstance(init_weights, str):
             self.init_weights = utils.weight_initializer[init_weights]
@@ -303,23 +303,25 @@ class IncrementalMap(SomBase):
         self._weights = self.init_weights(self.dims, train_data)
         eta_ = utils.decrease_linear(self.init_eta, self.n_iter, defaults.FINAL_ETA)
         nhr_ = utils.decrease_expo(self.init_nhr, self.n_iter, defaults.FINAL_NHR)
+        bmu_eval = utils.BMUEvaluator(train_data, self.metric)
 
-        np.random.seed(10)
+        rng = np.random.default_rng(10)
         for (c_iter, c_eta, c_nhr) in zip(range(self.n_iter), eta_, nhr_):
             if verbose:
                 print(f"iter: {c_iter:2} -- eta: {np.round(c_eta, 4):<5} -- "
                       f"nh: {np.round(c_nhr, 5):<6}")
 
-            for i, fvect in enumerate(np.random.permutation(train_data)):
+            for i, fvect in enumerate(rng.permutation(train_data)):
                 if output_weights:
                     fname = f"weights/weights_{c_iter:05}_{i:05}.npy"
                     with open(fname, "wb") as fobj:
                         np.save(fobj, self._weights, allow_pickle=False)
-                bmu, err = utils.best_match(self.weights, fvect, self.metric)
+                bmu, err = utils.best_match_unchecked(
+                    self._weights, fvect[None, :], self.metric)
                 self._hit_counts[bmu] += 1
                 m_idx = np.atleast_2d(np.unravel_index(bmu, self.shape)).T
                 neighbourhood = self._neighbourhood(self._grid.pos, m_idx, c_nhr)
                 self._weights += c_eta * neighbourhood * (fvect - self._weights)
 
-            _, err = utils.best_match(self.weights, train_data, self.metric)
+            _, err = bmu_eval.evaluate(self._weights)
             self._qrr[c_iter] = err.sum() / train_data.shape[0]
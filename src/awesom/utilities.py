@@ -3,14 +3,39 @@ Utilities for self.organizing maps.
 """
 
 import itertools
-from typing import Iterable, Iterator
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
 
 import numpy as np
 from scipy.spatial import distance
-from scipy import stats
+from scipy import sparse
 
+from . import defaults
 from . typealias import Array, Metric, SomDims
 
+if TYPE_CHECKING:
+    nb: Any = None
+    prange = range  # pylint: disable = invalid-name
+else:
+    try:
+        import numba as nb
+        from numba import prange
+    except ImportError:
+        nb = None
+        prange = range  # pylint: disable = invalid-name
+
+
+_rng = np.random.default_rng()
+
+
+def reseed(seed: int | None = None) -> None:
+    """Reseed the module random generator.
+
+    Args:
+        seed:  Seed for the generator. If ``None``, seed from the OS.
+    """
+    global _rng    # pylint: disable = global-statement, invalid-name
+    _rng = np.random.default_rng(seed)
+
 
 def grid_iter(n_rows: int, n_cols: int) -> Iterator[tuple[int, int]]:
     """Compute grid indices of an two-dimensional array.
@@ -35,37 +60,82 @@ def grid(n_rows: int, n_cols: int) -> Array:
     Returns:
         Two-dimensional array in which each row represents an multi-index.
     """
-    return np.array(list(grid_iter(n_rows, n_cols)))
+    rows, cols = np.indices((n_rows, n_cols))
+    return np.stack((rows.ravel(), cols.ravel()), axis=1)
 
 
-def decrease_linear(start: float, step: float, stop: float = 1.0
-                    ) -> Iterator[float]:
+def decrease_linear_arr(start: float, step: float, stop: float = 1.0
+                        ) -> Array:
     """Linearily decrease ``start``  in ``step`` steps to ``stop``."""
     if step < 1 or not isinstance(step, int):
         raise ValueError("Param `step` must be int >= 1.")
     if step == 1:
-        yield start
-    else:
-        coef = (stop - start) / (step - 1)
-        for stp in range(step):
-            yield coef * stp + start
+        return np.array([start], dtype="float64")
+    return np.linspace(start, stop, step)
 
 
-def decrease_expo(start: float, step: float, stop: float = 1.0
-                  ) -> Iterator[float]:
+def decrease_expo_arr(start: float, step: float, stop: float = 1.0
+                      ) -> Array:
     """Exponentially decrease ``start``  in ``step`` steps to ``stop``."""
     if step < 1 or not isinstance(step, int):
         raise ValueError("Param `step` must be int >= 1.")
     if step == 1:
-        yield start
-    else:
-        coef = np.log(stop / start) / (step - 1)
-        for stp in range(step):
-            yield start * np.exp(coef*stp)
+        return np.array([start], dtype="float64")
+    return np.geomspace(start, stop, step)
 
 
-def best_match(weights: Array, inp: Array, metric: Metric
-               ) -> tuple[Array, Array]:
+def decrease_linear(start: float, step: float, stop: float = 1.0
+                    ) -> Iterator[float]:
+    """Linearily decrease ``start``  in ``step`` steps to ``stop``."""
+    yield from decrease_linear_arr(start, step, stop)
+
+
+def decrease_expo(start: float, step: float, stop: float = 1.0
+                  ) -> Iterator[float]:
+    """Exponentially decrease ``start``  in ``step`` steps to ``stop``."""
+    yield from decrease_expo_arr(start, step, stop)
+
+
+if nb is not None:
+    @nb.njit(parallel=True, fastmath=True, cache=True)
+    def _bmu_numba(weights: Array, inp: Array) -> tuple[Array, Array]:
+        """Fused distance and argmin pass for squared Euclidean BMU search.
+
+        Avoids materializing the full ``n_units x n_inp`` distance matrix
+        by keeping a running minimum per input row. Rows of ``inp`` are
+        processed in parallel.
+
+        Args:
+            weights:  Two-dimensional, C-contiguous array of unit weights.
+            inp:      Two-dimensional, C-contiguous array of test vectors.
+
+        Returns:
+            Index and squared distance of best matching units.
+        """
+        n_units, n_feats = weights.shape
+        n_inp = inp.shape[0]
+        idx = np.empty(n_inp, dtype=np.int64)
+        dists = np.empty(n_inp, dtype=weights.dtype)
+        for i in prange(n_inp):
+            best = np.inf
+            best_idx = -1
+            for j in range(n_units):
+                acc = 0.0
+                for k in range(n_feats):
+                    diff = weights[j, k] - inp[i, k]
+                    acc += diff * diff
+                if acc < best:
+                    best = acc
+                    best_idx = j
+            idx[i] = best_idx
+            dists[i] = best
+        return idx, dists
+else:
+    _bmu_numba = None  # pylint: disable = invalid-name
+
+
+def best_match(weights: Array, inp: Array, metric: Metric,
+               dtype: np.dtype | str | None = None) -> tuple[Array, Array]:
     """Compute the best matching unit of ``weights`` for each
     element in ``inp``.
 
@@ -79,6 +149,10 @@ def best_match(weights: Array, inp: Array, metric: Metric
         inp:        Array of test vectors. If two-dimensional, rows are
                     assumed to represent observations.
         metric:     Distance metric to use.
+        dtype:      If given, cast ``weights`` and ``inp`` to this dtype
+                    and make them C-contiguous before computing distances.
+                    Passing ``"float32"`` halves the memory traffic of the
+                    distance kernels.
 
     Returns:
         Index and error of best matching units.
@@ -100,10 +174,207 @@ def best_match(weights: Array, inp: Array, metric: Metric
                "has to have one or two dimensions.")
         raise ValueError(msg)
 
+    if dtype is not None:
+        weights = np.ascontiguousarray(weights, dtype=dtype)
+        inp = np.ascontiguousarray(inp, dtype=dtype)
+
+    return best_match_unchecked(weights, inp, metric)
+
+
+def best_match_unchecked(weights: Array, inp: Array, metric: Metric
+                         ) -> tuple[Array, Array]:
+    """BMU search without input validation.
+
+    Fast path for the training loop, which calls into BMU search
+    thousands of times with arrays of known shape. Assumes ``weights``
+    and ``inp`` are two-dimensional with matching feature dimensions.
+
+    Args:
+        weights:    Two-dimensional array of unit weights.
+        inp:        Two-dimensional array of test vectors.
+        metric:     Distance metric to use.
+
+    Returns:
+        Index and error of best matching units.
+    """
+    n_inp = inp.shape[0]
+    if n_inp <= defaults.BMU_CHUNK_SIZE:
+        return _bmu_chunk(weights, inp, metric)
+
+    bmu = np.empty(n_inp, dtype="int64")
+    errs = np.empty(n_inp)
+    for start in range(0, n_inp, defaults.BMU_CHUNK_SIZE):
+        chunk = slice(start, start + defaults.BMU_CHUNK_SIZE)
+        bmu[chunk], errs[chunk] = _bmu_chunk(weights, inp[chunk], metric)
+    return bmu, errs
+
+
+def _bmu_chunk(weights: Array, inp: Array, metric: Metric
+               ) -> tuple[Array, Array]:
+    """BMU search on a single chunk of validated, two-dimensional input.
+
+    Args:
+        weights:    Two-dimensional array of unit weights.
+        inp:        Two-dimensional array of test vectors.
+        metric:     Distance metric to use.
+
+    Returns:
+        Index and error of best matching units.
+    """
+    if metric in ("euclidean", "sqeuclidean"):
+        if _bmu_numba is not None:
+            bmu, errs = _bmu_numba(np.ascontiguousarray(weights),
+                                   np.ascontiguousarray(inp))
+        else:
+            w_norms = np.einsum("ij,ij->i", weights, weights)
+            i_norms = np.einsum("ij,ij->i", inp, inp)
+            dists = w_norms[:, None] + i_norms[None, :] - 2.0 * weights @ inp.T
+            np.maximum(dists, 0, out=dists)
+            bmu = dists.argmin(axis=0)
+            errs = dists[bmu, np.arange(inp.shape[0])]
+        if metric == "euclidean":
+            errs = np.sqrt(errs)
+        return bmu, errs
+
     dists = distance.cdist(weights, inp, metric)
     return dists.argmin(axis=0), dists.min(axis=0)
 
 
+class BMUEvaluator:
+    """Best matching unit search against a fixed input data set.
+
+    Training evaluates BMUs for the same inputs on every epoch while the
+    weights change. The squared norms of the inputs are computed once at
+    construction, so each evaluation only pays for the weight-side work.
+
+    The evaluator can additionally carry the unit weights and their
+    squared norms as state. Callers that only touch a few weight rows
+    between evaluations use ``update_weights`` to refresh the norms of
+    just those rows.
+
+    Args:
+        inp:      Two-dimensional array of input vectors.
+        metric:   Distance metric to use.
+        weights:  Optional two-dimensional array of unit weights.
+    """
+    def __init__(self, inp: Array, metric: Metric = "euclidean",
+                 weights: Array | None = None) -> None:
+        self.inp = np.atleast_2d(inp)
+        self.metric = metric
+        self.inp_sqnorms = np.einsum("ij,ij->i", self.inp, self.inp)
+        self.weights: Array | None = None
+        self.w_sqnorms: Array | None = None
+        if weights is not None:
+            self.set_weights(weights)
+
+    def set_weights(self, weights: Array) -> None:
+        """Store ``weights`` and cache their squared norms.
+
+        Args:
+            weights:  Two-dimensional array of unit weights.
+        """
+        weights = np.atleast_2d(weights)
+        self.weights = weights
+        self.w_sqnorms = np.einsum("ij,ij->i", weights, weights)
+
+    def update_weights(self, changed_idx: Array, new_rows: Array) -> None:
+        """Patch the rows ``changed_idx`` of the stored weights and
+        recompute only their squared norms.
+
+        Args:
+            changed_idx:  Indices of the changed weight rows.
+            new_rows:     New values of the changed rows.
+        """
+        if self.weights is None or self.w_sqnorms is None:
+            raise ValueError("Weights not initialized")
+        new_rows = np.atleast_2d(new_rows)
+        self.weights[changed_idx] = new_rows
+        self.w_sqnorms[changed_idx] = np.einsum("ij,ij->i",
+                                                new_rows, new_rows)
+
+    def evaluate(self, weights: Array | None = None) -> tuple[Array, Array]:
+        """Compute the best matching unit of ``weights`` for each input
+        vector.
+
+        Args:
+            weights:  Two-dimensional array of unit weights. If ``None``,
+                      the stored weights and their cached squared norms
+                      are used.
+
+        Returns:
+            Index and error of best matching units.
+        """
+        if weights is None:
+            if self.weights is None or self.w_sqnorms is None:
+                raise ValueError("Weights not initialized")
+            weights = self.weights
+            w_norms = self.w_sqnorms
+        else:
+            w_norms = np.einsum("ij,ij->i", weights, weights)
+
+        n_inp = self.inp.shape[0]
+        if n_inp <= defaults.BMU_CHUNK_SIZE:
+            return self._evaluate_chunk(weights, w_norms, slice(None))
+
+        bmu = np.empty(n_inp, dtype="int64")
+        errs = np.empty(n_inp)
+        for start in range(0, n_inp, defaults.BMU_CHUNK_SIZE):
+            chunk = slice(start, start + defaults.BMU_CHUNK_SIZE)
+            bmu[chunk], errs[chunk] = self._evaluate_chunk(weights, w_norms,
+                                                           chunk)
+        return bmu, errs
+
+    def _evaluate_chunk(self, weights: Array, w_norms: Array, chunk: slice
+                        ) -> tuple[Array, Array]:
+        """Compute best matching units for one chunk of the input vectors.
+
+        Args:
+            weights:  Two-dimensional array of unit weights.
+            w_norms:  Squared norms of the weight rows.
+            chunk:    Slice of input vectors to evaluate.
+
+        Returns:
+            Index and error of best matching units.
+        """
+        inp = self.inp[chunk]
+        if self.metric in ("euclidean", "sqeuclidean"):
+            dists = (w_norms[:, None] + self.inp_sqnorms[chunk][None, :]
+                     - 2.0 * weights @ inp.T)
+            np.maximum(dists, 0, out=dists)
+            bmu = dists.argmin(axis=0)
+            errs = dists[bmu, np.arange(inp.shape[0])]
+            if self.metric == "euclidean":
+                errs = np.sqrt(errs)
+            return bmu, errs
+
+        dists = distance.cdist(weights, inp, self.metric)
+        return dists.argmin(axis=0), dists.min(axis=0)
+
+
+def _pca_top2(data_centered: Array) -> tuple[Array, Array, Array]:
+    """Compute the two leading principal components by subspace iteration.
+
+    Specialization for ``sample_pca``, which only ever needs two
+    components. A few power iterations on a random two-column block
+    find the leading subspace without decomposing the full data matrix.
+
+    Args:
+        data_centered:  Centered data set.
+
+    Returns:
+        Two largest singular values,
+        two largest eigen vectors,
+        transformed input data.
+    """
+    omega = _rng.standard_normal((data_centered.shape[1], 2))
+    basis, _ = np.linalg.qr(data_centered @ omega)
+    for _ in range(4):
+        basis, _ = np.linalg.qr(data_centered @ (data_centered.T @ basis))
+    _, vals, vects = np.linalg.svd(basis.T @ data_centered,
+                                   full_matrices=False)
+    return vals, vects, data_centered @ vects.T
+
+
 def sample_pca(dims: SomDims, data: Array | None = None, **kwargs) -> Array:
     """Compute initial SOM weights by sampling from the first two principal
     components of the input data.
@@ -122,8 +393,9 @@ def sample_pca(dims: SomDims, data: Array | None = None, **kwargs) -> Array:
     n_rows, n_cols, n_feats = dims
 
     if data is None:
-        data = np.random.randint(-100, 100, (300, n_feats))
-    _, vects, trans_data = pca(data, 2)
+        data = _rng.integers(-100, 100, (300, n_feats))
+    data_mean = data.mean(axis=0)
+    _, vects, trans_data = _pca_top2(data - data_mean)
     data_min = trans_data.min(axis=0)
     data_max = trans_data.max(axis=0)
     if "adapt" in kwargs and kwargs['adapt'] is True:
@@ -132,9 +404,10 @@ def sample_pca(dims: SomDims, data: Array | None = None, **kwargs) -> Array:
         shape = (n_rows, n_cols)
     dim_x = np.linspace(data_min[0], data_max[0], shape[0])
     dim_y = np.linspace(data_min[1], data_max[1], shape[1])
-    grid_x, grid_y = np.meshgrid(dim_x, dim_y)
-    points = np.vstack((grid_x.ravel(), grid_y.ravel()))
-    weights = points.T @ vects + data.mean(axis=0)
+    coords_x = np.tile(dim_x, shape[1])
+    coords_y = np.repeat(dim_y, shape[0])
+    weights = (np.outer(coords_x, vects[0]) + np.outer(coords_y, vects[1])
+               + data_mean)
     return weights
 
 
@@ -153,11 +426,10 @@ def sample_rnd(dims: SomDims, data: Array | None = None) -> Array:
     if data is not None:
         data_limits = np.column_stack((data.min(axis=0), data.max(axis=0)))
     else:
-        data_limits = np.random.randint(-10, 10, (n_feats, 2))
+        data_limits = _rng.integers(-10, 10, (n_feats, 2))
         data_limits.sort()
-    weights = [np.random.uniform(dmin, dmax, n_units)
-               for (dmin, dmax) in data_limits]
-    return np.column_stack(weights)
+    return _rng.uniform(data_limits[:, 0], data_limits[:, 1],
+                             (n_units, n_feats))
 
 
 def sample_stm(dims: SomDims, data: Array | None = None) -> Array:
@@ -192,10 +464,10 @@ def sample_stm(dims: SomDims, data: Array | None = None) -> Array:
 
     n_states = int(n_states)
     n_units = n_rows * n_cols
-    alpha = np.random.randint(1, 10, (n_states, n_states))
-    st_matrix = np.hstack([stats.dirichlet(a).rvs(size=n_units)
-                           for a in alpha])
-    return st_matrix
+    alpha = _rng.integers(1, 10, (n_states, n_states))
+    gammas = _rng.standard_gamma(alpha, (n_units, n_states, n_states))
+    gammas /= gammas.sum(axis=2, keepdims=True)
+    return gammas.reshape(n_units, n_states*n_states)
 
 
 def sample_hist(dims: SomDims, data: Array | None = None) -> Array:
@@ -209,7 +481,7 @@ def sample_hist(dims: SomDims, data: Array | None = None) -> Array:
         Two-dimensional array in which each row is a historgram.
     """
     n_rows, n_cols, n_feats = dims
-    return stats.dirichlet(np.ones(n_feats)).rvs(n_rows*n_cols)
+    return _rng.dirichlet(np.ones(n_feats), n_rows*n_cols)
 
 
 def distribute(bmu_idx: Iterable[int], n_units: int
@@ -230,13 +502,16 @@ def distribute(bmu_idx: Iterable[int], n_units: int
         The corresponding value is a list of indices of those training data
         vectors that have been mapped to this unit.
     """
-    unit_matches: dict[int, list[int]] = {i: [] for i in range(n_units)}
-    for data_idx, bmu in enumerate(bmu_idx):
-        unit_matches[bmu].append(data_idx)
-    return unit_matches
+    if not isinstance(bmu_idx, np.ndarray):
+        bmu_idx = np.fromiter(bmu_idx, dtype="int64")
+    order = np.argsort(bmu_idx, kind="stable")
+    counts = np.bincount(bmu_idx, minlength=n_units)
+    buckets = np.split(order, counts.cumsum()[:-1])
+    return {i: bucket.tolist() for i, bucket in enumerate(buckets)}
 
 
-def pca(data: Array, n_comps: int = 2) -> tuple[Array, Array, Array]:
+def pca(data: Array, n_comps: int = 2, dtype: np.dtype | str | None = None,
+        inplace: bool = False) -> tuple[Array, Array, Array]:
     """Perfom principal component analysis
 
     Interanlly, ``data`` will be centered but not scaled.
@@ -244,21 +519,82 @@ def pca(data: Array, n_comps: int = 2) -> tuple[Array, Array, Array]:
     Args:
         data:     Data set
         n_comps:  Number of principal components
+        dtype:    If given, cast ``data`` to this dtype and make it
+                  C-contiguous before the decomposition.
+        inplace:  If ``True``, center float ``data`` in place instead of
+                  copying it. The caller's array is modified.
 
     Returns:
         ``n_comps`` largest singular values,
         ``n_comps`` largest eigen vectors,
         transformed input data.
     """
-    data_centered = (data - data.mean(axis=0))
-    _, vals, vects = np.linalg.svd(data_centered)
-
-    ord_idx = np.flip(vals.argsort())[:n_comps]
-    vals = vals[ord_idx]
-    vects = vects[ord_idx]
+    if dtype is not None:
+        data = np.ascontiguousarray(data, dtype=dtype)
+    data_mean = data.mean(axis=0)
+    if inplace:
+        if not np.issubdtype(data.dtype, np.floating):
+            msg = ("In-place centering requires float ``data``, but it "
+                   f"has dtype {data.dtype}.")
+            raise ValueError(msg)
+        data -= data_mean
+        data_centered = data
+    elif np.issubdtype(data.dtype, np.floating):
+        data_centered = np.empty_like(data)
+        np.subtract(data, data_mean, out=data_centered)
+    else:
+        data_centered = data - data_mean
+    n_obs, n_feats = data_centered.shape
+
+    if n_feats <= n_obs:
+        scatter = data_centered.T @ data_centered
+        eig_vals, eig_vects = np.linalg.eigh(scatter)
+        ord_idx = np.flip(eig_vals.argsort())[:n_comps]
+        vals = np.sqrt(np.maximum(eig_vals[ord_idx], 0))
+        vects = eig_vects[:, ord_idx].T
+    else:
+        _, vals, vects = sparse.linalg.svds(data_centered, k=n_comps)
+        ord_idx = np.flip(vals.argsort())
+        vals = vals[ord_idx]
+        vects = vects[ord_idx]
     return vals, vects, data_centered @ vects.T
 
 
+if nb is not None:
+    @nb.njit(parallel=True, fastmath=True, cache=True)
+    def _scale_rows(arr: Array, new_min: float, new_max: float) -> Array:
+        """Scale each row of ``arr`` between ``new_min`` and ``new_max``.
+
+        Computes the row minimum and maximum in a single fused reduction
+        and writes the scaled output in a second pass, instead of three
+        full traversals of ``arr``. Rows are processed in parallel.
+
+        Args:
+            arr:        Two-dimensional, C-contiguous float array.
+            new_min:    Lower bound.
+            new_max:    Upper bound.
+
+        Return:
+            Array of transformed values.
+        """
+        out = np.empty_like(arr)
+        for i in prange(arr.shape[0]):
+            xmin = arr[i, 0]
+            xmax = arr[i, 0]
+            for j in range(1, arr.shape[1]):
+                val = arr[i, j]
+                if val < xmin:
+                    xmin = val
+                if val > xmax:
+                    xmax = val
+            fact = (new_max - new_min) / (xmax - xmin)
+            for j in range(arr.shape[1]):
+                out[i, j] = (arr[i, j] - xmin) * fact + new_min
+        return out
+else:
+    _scale_rows = None  # pylint: disable = invalid-name
+
+
 def scale(arr: Array, new_min: int = 0, new_max: int = 1, axis: int = -1
           ) -> Array:
     """Scale ``arr`` between ``new_min`` and ``new_max``
@@ -271,6 +607,11 @@ def scale(arr: Array, new_min: int = 0, new_max: int = 1, axis: int = -1
     Return:
         One-dimensional array of transformed values.
     """
+    if (_scale_rows is not None and arr.ndim == 2 and axis in (-1, 1)
+            and np.issubdtype(arr.dtype, np.floating)):
+        return _scale_rows(np.ascontiguousarray(arr),
+                           float(new_min), float(new_max))
+
     xmax = arr.max(axis=axis, keepdims=True)
     xmin = arr.min(axis=axis, keepdims=True)
 